@@ -7,6 +7,7 @@ Processed output directory: <root_dir>/RUMI_processed
 """
 
 import argparse
+import inspect
 import logging
 from pathlib import Path
 
@@ -65,7 +66,8 @@ STEP_OUTPUT_GLOBS = {
     "dive_summaries": "all_dive_summaries.csv",
     "process_dat": "*/[!.]*_pitch_roll_heading_octans.csv",
     "usbl_sdyn": "*/[!.]*_USBL_Hercules.csv",
-    "sensors_sealog": "*/[!.]*_sealog_sensors_merged.csv",
+    # sensors_sealog resumes per dive internally (mtime check) -- always run
+    # it, so a partially completed run picks up the remaining dives.
     # stillcam_images resumes per image internally -- always run it.
 }
 
@@ -77,7 +79,7 @@ def step_outputs_exist(name, root_dir):
     return any((Path(root_dir) / "RUMI_processed").glob(pattern))
 
 
-def run_step(script_module, root_dir, force=False) -> str:
+def run_step(script_module, root_dir, force=False, jobs=None) -> str:
     """
     Run script_module.process_data(root_dir).
     Returns 'ok', 'skipped', or 'failed'.
@@ -90,7 +92,16 @@ def run_step(script_module, root_dir, force=False) -> str:
     logging.debug(f"Starting {name}")
     print(f"\nProcessing {name}...")
     try:
-        script_module.process_data(root_dir)
+        # Steps with internal per-item resume or parallelism (e.g.
+        # sensors_sealog) accept force/jobs flags; pass along whichever ones
+        # their process_data supports.
+        params = inspect.signature(script_module.process_data).parameters
+        kwargs = {}
+        if "force" in params:
+            kwargs["force"] = force
+        if "jobs" in params:
+            kwargs["jobs"] = jobs
+        script_module.process_data(root_dir, **kwargs)
         print(f"Finished {name}.")
         logging.debug(f"Finished {name}")
         return "ok"
@@ -105,6 +116,9 @@ def main():
     parser.add_argument("--dir", help="Raw data root directory (skips the interactive prompt)")
     parser.add_argument("--force", action="store_true",
                         help="Rerun every step even if its outputs already exist")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Cap worker processes for parallel steps "
+                             "(default: one per CPU core)")
     args = parser.parse_args()
 
     logging.debug("Starting main()")
@@ -127,7 +141,7 @@ def main():
     statuses = {}
     for idx, (title, module) in enumerate(steps, start=1):
         print(f"\n[ Step {idx} ]: {title}")
-        status = run_step(module, root_dir, force=args.force)
+        status = run_step(module, root_dir, force=args.force, jobs=args.jobs)
         statuses[module.__name__.split('.')[-1]] = status
         if status == "failed":
             break
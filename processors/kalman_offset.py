@@ -20,13 +20,13 @@ It also prints an on-screen summary indicating how many depth values remain belo
 
 from pathlib import Path
 import pandas as pd
-import csv
 import rasterio
+from rasterio.transform import rowcol
 import numpy as np
 import matplotlib.pyplot as plt
 from pyproj import CRS, Proj, Transformer
 
-from processors.common import expedition_dive_from_processed_dir, utm_proj_string
+from processors.common import expedition_dive_from_processed_dir, utm_proj_string, write_csv
 from processors.report import RunReport
 
 # Vehicle position is shifted this many meters backwards along the heading.
@@ -34,19 +34,6 @@ OFFSET_M = 2.0
 # Adjusted depth must end up at least this many meters above the terrain.
 MIN_CLEARANCE_M = 1.0
 
-def safe_get_loc(df, col_name):
-    """
-    Returns the integer location of the specified column.
-    If multiple indices are returned (duplicate column names),
-    returns the first index.
-    """
-    loc = df.columns.get_loc(col_name)
-    try:
-        return int(loc)
-    except TypeError:
-        # If loc is array-like, return the first element.
-        return int(loc[0])
-
 def process_data(raw_dir, processed_dir):
     """
     Performs UTM assessment and adjusts vehicle positioning.
@@ -126,10 +113,9 @@ def process_data(raw_dir, processed_dir):
     dy = (OFFSET_M * np.cos(offset_heading)).fillna(0.0)
     df[x_col] = df[x_col] - dx
     df[y_col] = df[y_col] - dy
-
-    # Save offset positions for later neighbor evaluation.
-    df['Offset_x'] = df[x_col]
-    df['Offset_y'] = df[y_col]
+    # x_col/y_col now hold the offset positions; the Offset_x/Offset_y output
+    # columns are materialized just before writing (keeping exact-copy float
+    # columns alive through the raster stage doubled the position memory).
 
     # ------------------------------------------------------------------
     # Rebuild the UTM projection kalman_filter used (derived from the same
@@ -156,23 +142,38 @@ def process_data(raw_dir, processed_dir):
             raise ValueError(f"GeoTIFF {geotiff_path.name} has no CRS; cannot sample safely.")
         to_raster = Transformer.from_crs(vehicle_crs, raster_crs, always_xy=True)
         raster_x, raster_y = to_raster.transform(
-            df['Offset_x'].to_numpy(), df['Offset_y'].to_numpy()
+            df[x_col].to_numpy(), df[y_col].to_numpy()
         )
 
-        # Center-pixel sample at every offset position. Off-raster and nodata
-        # samples become NaN so they impose no depth constraint (previously
-        # they sampled as 0 and forced the depth to the sea surface).
-        coords = list(zip(raster_x, raster_y))
-        finite = [np.isfinite(x) and np.isfinite(y) for x, y in coords]
-        n_bad_coord = len(coords) - sum(finite)
+        # Read the band once and sample everything with array indexing. The
+        # previous per-row src.sample / windowed-read calls paid rasterio's
+        # per-call overhead for every position; one bulk read plus fancy
+        # indexing does the same work in a handful of numpy passes. (Dive-map
+        # GeoTIFFs are tens of MB, so holding the band in memory is fine.)
+        band = src.read(1, masked=True)
+        band_center = np.ma.filled(band.astype(float), np.nan)    # nodata -> NaN
+        band_max = np.ma.filled(band.astype(float), -np.inf)      # nodata ignored in max
+
+        finite = np.isfinite(raster_x) & np.isfinite(raster_y)
+        n_bad_coord = int((~finite).sum())
         if n_bad_coord:
             print(f"Note: {n_bad_coord} positions have non-finite coordinates and "
                   f"will not be terrain-adjusted.")
-        safe_coords = [(x, y) if ok else (0.0, 0.0) for (x, y), ok in zip(coords, finite)]
-        sampled = [
-            float(val[0]) if (ok and not np.ma.is_masked(val[0])) else np.nan
-            for val, ok in zip(src.sample(safe_coords, masked=True), finite)
-        ]
+        # src.index coerces its result to scalar ints, so call the
+        # array-capable transform.rowcol for the whole track at once.
+        rows, cols = rowcol(src.transform,
+                            np.where(finite, raster_x, 0.0),
+                            np.where(finite, raster_y, 0.0))
+        rows = np.asarray(rows)
+        cols = np.asarray(cols)
+        on_raster = (finite & (rows >= 0) & (rows < src.height)
+                     & (cols >= 0) & (cols < src.width))
+
+        # Center-pixel sample at every offset position. Off-raster and nodata
+        # samples become NaN so they impose no depth constraint (previously
+        # they sampled as 0 and forced the depth to the sea surface).
+        sampled = np.full(len(df), np.nan)
+        sampled[on_raster] = band_center[rows[on_raster], cols[on_raster]]
         df['geotiff_value'] = sampled
         n_nodata = int(np.isnan(sampled).sum())
         if n_nodata:
@@ -183,45 +184,38 @@ def process_data(raw_dir, processed_dir):
             sev("off-raster",
                 f"{n_nodata} of {len(sampled)} positions ({frac:.1%}) fall outside the "
                 f"GeoTIFF or on nodata; no terrain clearance applied there")
-        df['below_surface'] = df[depth_col] < df['geotiff_value'] + MIN_CLEARANCE_M
-        df.loc[df['below_surface'], depth_col] = df['geotiff_value'] + MIN_CLEARANCE_M
-
         # Neighbor evaluation: raise depth to MIN_CLEARANCE_M above the highest
-        # pixel in the 3x3 window around each offset position.
-        from rasterio.windows import Window
-
-        def max_neighbor_value(x, y, window_size=3):
-            row_idx, col_idx = src.index(x, y)
-            half = window_size // 2
-            # Clamp the window to the raster extent (avoids boundless reads,
-            # which are buggy in some rasterio versions and slower).
-            r0, c0 = max(row_idx - half, 0), max(col_idx - half, 0)
-            r1 = min(row_idx + half + 1, src.height)
-            c1 = min(col_idx + half + 1, src.width)
-            if r1 <= r0 or c1 <= c0:
-                return -np.inf  # entirely off-raster: no neighbor constraint
-            data = src.read(1, window=Window(c0, r0, c1 - c0, r1 - r0), masked=True)
-            if np.ma.is_masked(data) and data.mask.all():
-                return -np.inf  # all nodata: no neighbor constraint
-            return float(data.max())
-
+        # pixel in the 3x3 window around each offset position. Out-of-range
+        # neighbor cells are skipped (same clamping as the old windowed read);
+        # positions whose whole window is off-raster or nodata stay at -inf
+        # and impose no constraint.
+        max_nb = np.full(len(df), -np.inf)
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                rr = rows + dr
+                cc = cols + dc
+                ok = (finite & (rr >= 0) & (rr < src.height)
+                      & (cc >= 0) & (cc < src.width))
+                vals = band_max[np.clip(rr, 0, src.height - 1),
+                                np.clip(cc, 0, src.width - 1)]
+                np.maximum(max_nb, np.where(ok, vals, -np.inf), out=max_nb)
+
+        # Fused clearance adjustment: depth must end up at least
+        # MIN_CLEARANCE_M above max(center pixel, 3x3 neighbor max). The
+        # window contains the center pixel, so this single floor subsumes the
+        # old three passes (center adjust, neighbor adjust, re-evaluation).
+        # NaN centers and all-off-raster windows reduce to -inf and impose no
+        # constraint; NaN depths are left untouched.
+        terrain = np.fmax(np.where(np.isnan(sampled), -np.inf, sampled), max_nb)
+        floor_depth = terrain + MIN_CLEARANCE_M
         depths = df[depth_col].to_numpy(copy=True)
-        for pos, (x, y) in enumerate(coords):
-            if not finite[pos]:
-                continue
-            max_nb = max_neighbor_value(x, y)
-            if depths[pos] - max_nb < MIN_CLEARANCE_M:
-                depths[pos] = max_nb + MIN_CLEARANCE_M
+        adjusted = depths < floor_depth
+        depths[adjusted] = floor_depth[adjusted]
         df[depth_col] = depths
 
-    # Re-evaluate: ensure each new depth is at least MIN_CLEARANCE_M above the
-    # center pixel's terrain value.
-    below_threshold = df[depth_col] < (df['geotiff_value'] + MIN_CLEARANCE_M)
-    num_adjustments = below_threshold.sum()
-    if num_adjustments > 0:
-        df.loc[below_threshold, depth_col] = df.loc[below_threshold, 'geotiff_value'] + MIN_CLEARANCE_M
-    print(f"After re-evaluation, adjusted {num_adjustments} depth values to ensure "
-          f"they are at least {MIN_CLEARANCE_M}m above terrain.")
+    num_adjustments = int(adjusted.sum())
+    print(f"Adjusted {num_adjustments} depth values to ensure they are at least "
+          f"{MIN_CLEARANCE_M}m above terrain.")
 
     # ---- Visualization & Summary Section ----
     # Compute depth difference: (adjusted Depth) - (center pixel value).
@@ -234,7 +228,7 @@ def process_data(raw_dir, processed_dir):
         report.anomaly("terrain-clearance",
                        f"{num_below} of {total_rows} depths remain < {MIN_CLEARANCE_M}m "
                        f"above terrain after adjustment (should be 0)")
-    report.metric("depths_adjusted_for_clearance", int(df['below_surface'].sum()))
+    report.metric("depths_adjusted_for_clearance", num_adjustments)
 
     # Create a scatter plot of offset positions (NaN depth_diff = off-raster,
     # excluded from both groups).
@@ -244,8 +238,8 @@ def process_data(raw_dir, processed_dir):
     scatter_fig, scatter_ax = plt.subplots(figsize=(10, 8))
     if pos_mask.sum() > 0:
         scatter_ax.scatter(
-            df.loc[pos_mask, 'Offset_x'],
-            df.loc[pos_mask, 'Offset_y'],
+            df.loc[pos_mask, x_col],
+            df.loc[pos_mask, y_col],
             c=df.loc[pos_mask, 'depth_diff'],
             cmap='viridis',
             s=10,
@@ -253,8 +247,8 @@ def process_data(raw_dir, processed_dir):
         )
     if neg_mask.sum() > 0:
         scatter_ax.scatter(
-            df.loc[neg_mask, 'Offset_x'],
-            df.loc[neg_mask, 'Offset_y'],
+            df.loc[neg_mask, x_col],
+            df.loc[neg_mask, y_col],
             color='red',
             s=10,
             label="Depth Diff < 0"
@@ -270,15 +264,18 @@ def process_data(raw_dir, processed_dir):
 
     # --------------------------------------------------------------------------
     # Carryover corrected UTM converted coordinates.
-    # Create new columns for the final output.
-    df['UTM_X'] = df['Offset_x']
-    df['UTM_Y'] = df['Offset_y']
+    # Create new columns for the final output (kalman_x/kalman_y themselves
+    # are dropped below).
+    df['Offset_x'] = df[x_col]
+    df['Offset_y'] = df[y_col]
+    df['UTM_X'] = df[x_col]
+    df['UTM_Y'] = df[y_col]
 
     # Keep Latitude/Longitude consistent with the offset UTM position
     # (previously the file carried the un-offset kalman lat/long alongside
     # the offset UTM_X/UTM_Y).
-    off_lon, off_lat = vehicle_proj(df['Offset_x'].to_numpy(),
-                                    df['Offset_y'].to_numpy(), inverse=True)
+    off_lon, off_lat = vehicle_proj(df[x_col].to_numpy(),
+                                    df[y_col].to_numpy(), inverse=True)
     df['kalman_lat'] = off_lat
     df['kalman_long'] = off_lon
     # --------------------------------------------------------------------------
@@ -305,21 +302,14 @@ def process_data(raw_dir, processed_dir):
     df['Pitch'] = np.degrees(df['Pitch_rad'])
     df['Roll'] = np.degrees(df['Roll_rad'])
 
-    # Reorder columns: insert Heading, Pitch, Roll immediately to the left of "Depth".
-    if 'Depth' in df.columns:
-        depth_idx = safe_get_loc(df, 'Depth')
-        for col in reversed(['Heading', 'Pitch', 'Roll']):
-            series = df.pop(col)
-            df.insert(depth_idx, col, series)
-
-    # Drop unnecessary columns.
+    # Columns to leave out of the final CSV.
     drop_cols = [
         'x_usbl', 'y_usbl', 'x_dvl', 'y_dvl',
         'Heading_rad',       # the filtered heading we used; discard from final
         'Pitch_rad', 'Roll_rad',
         'kalman_yaw_deg', 'kalman_roll_deg', 'kalman_pitch_deg',
         'kalman_x', 'kalman_y',
-        'geotiff_value', 'below_surface', 'depth_diff',
+        'geotiff_value', 'depth_diff',
         '_orig_heading_rad',
         # Requested drops for the *uom fields:
         'vehicleRealtimeDualHDGrabData.camera_name_2_uom',
@@ -327,10 +317,21 @@ def process_data(raw_dir, processed_dir):
         'vehicleRealtimeDualHDGrabData.filename_2_uom',
         'vehicleRealtimeDualHDGrabData.filename_uom'
     ]
-    df.drop(columns=[c for c in drop_cols if c in df.columns], inplace=True, errors='ignore')
-
-    # Save final CSV with all fields quoted.
-    df.to_csv(output_file, index=False, quotechar='"', quoting=csv.QUOTE_ALL)
+    # One projection applies the drops and the column order together (Heading,
+    # Pitch, Roll immediately left of Depth), instead of three pop/insert
+    # moves followed by a separate drop - each of which copied the frame.
+    drop_set = set(drop_cols)
+    final_order = [c for c in df.columns
+                   if c not in drop_set and c not in ('Heading', 'Pitch', 'Roll')]
+    if 'Depth' in final_order:
+        depth_idx = final_order.index('Depth')
+        final_order[depth_idx:depth_idx] = ['Heading', 'Pitch', 'Roll']
+    else:
+        final_order += ['Heading', 'Pitch', 'Roll']
+    df = df[final_order]
+
+    # Save final CSV with all populated fields quoted (Arrow writer).
+    write_csv(df, output_file, quote_all=True)
     print(f"UTM assessment results saved to: {output_file}")
 
     report.metric("rows_out", len(df))
@@ -1,35 +1,21 @@
 from pathlib import Path
-import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import io
 import csv
+import mmap
 import pandas as pd
-from datetime import datetime, timezone, timedelta
 
-from processors.common import best_fix_per_second, drop_duplicate_timestamps
+from processors.common import (
+    best_fix_per_second,
+    drop_duplicate_timestamps,
+    file_set_fingerprint,
+    load_ingest_cache,
+    save_ingest_cache,
+    slice_time_window,
+    write_csv,
+)
 from processors.report import RunReport
 
-# ------------------------------------------------------------------------------
-# Function: split_lat_long
-# ------------------------------------------------------------------------------
-def split_lat_long(df, column_name):
-    """
-    Splits a column containing a combined latitude-longitude string (separated by a space)
-    into two separate numeric columns: {column_name}_lat and {column_name}_long.
-    """
-    if column_name in df.columns:
-        df[[f"{column_name}_lat", f"{column_name}_long"]] = (
-            df[column_name].str.split(" ", expand=True).astype(float)
-        )
-        df.drop(columns=[column_name], inplace=True)
-        old_cols = list(df.columns)
-        lat_col, long_col = f"{column_name}_lat", f"{column_name}_long"
-        for c in [lat_col, long_col]:
-            if c in old_cols:
-                old_cols.remove(c)
-        old_cols.append(lat_col)
-        old_cols.append(long_col)
-        df = df[old_cols]
-    return df
-
 # ------------------------------------------------------------------------------
 # Function: extract_objective
 # ------------------------------------------------------------------------------
@@ -58,6 +44,80 @@ def convert_to_iso(dt_series):
         lambda dt: dt.replace(microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ") if pd.notnull(dt) else dt
     )
 
+# ------------------------------------------------------------------------------
+# Function: parse_timestamps_vectorized
+# ------------------------------------------------------------------------------
+def parse_timestamps_vectorized(date_col, time_col):
+    """
+    Parses 'YYYY/MM/DD' + 'HH:MM:SS[.fff]' string columns into a UTC
+    datetime64 Series in one vectorized pass (with and without fractional
+    seconds). Unparseable rows (e.g. a second field of 60+) become NaT.
+    cache=True memoizes repeated datetime strings inside pandas, which makes
+    high-rate telemetry (many fixes per source second) near-free to re-parse.
+    """
+    dt_str = date_col + " " + time_col
+    ts = pd.to_datetime(dt_str, format="%Y/%m/%d %H:%M:%S.%f",
+                        utc=True, errors="coerce", cache=True)
+    missing = ts.isna()
+    if missing.any():
+        ts[missing] = pd.to_datetime(dt_str[missing], format="%Y/%m/%d %H:%M:%S",
+                                     utc=True, errors="coerce", cache=True)
+    # pandas rolls a second field of 60+ over into the next minute instead of
+    # rejecting it like strptime; treat those rows as unparseable.
+    secs = pd.to_numeric(
+        time_col.str.split(":").str[2].str.split(".").str[0], errors="coerce"
+    )
+    ts[(secs >= 60) | secs.isna()] = pd.NaT
+    return ts
+
+
+def _find_prefixed_lines(buf, prefix):
+    """
+    Collects every line of a bytes-like buffer that starts with prefix, by
+    jumping between occurrences with C-level find instead of splitting (and
+    decoding) all the intervening lines. Trailing CRs are trimmed.
+    """
+    lines = []
+    size = len(buf)
+    if buf[:len(prefix)] == prefix:
+        pos = 0
+    else:
+        hit = buf.find(b"\n" + prefix)
+        pos = -1 if hit == -1 else hit + 1
+    while pos != -1:
+        eol = buf.find(b"\n", pos)
+        end = size if eol == -1 else eol
+        if buf[end - 1:end] == b"\r":
+            lines.append(bytes(buf[pos:end - 1]))
+        else:
+            lines.append(bytes(buf[pos:end]))
+        hit = buf.find(b"\n" + prefix, end)
+        pos = -1 if hit == -1 else hit + 1
+    return lines
+
+
+def _read_whitespace_table(lines, n_cols, extra_cols=45):
+    """
+    Parses a list of whitespace-delimited byte lines into a string DataFrame
+    with n_cols columns via pandas' C tokenizer. The original per-line regexes
+    were unanchored, so records carrying trailing extra fields must still
+    parse: the tokenizer is given extra_cols columns of headroom and only the
+    first n_cols are returned. Short lines pad with NaN and fail the callers'
+    field validation as before.
+
+    Returns (df, skipped_count) where skipped_count is the number of lines
+    dropped for exceeding even the padded layout.
+    """
+    blob = b"\n".join(lines)
+    tbl = pd.read_csv(
+        io.BytesIO(blob), sep=r"\s+", header=None,
+        names=range(n_cols + extra_cols),
+        dtype=str, encoding="utf-8", encoding_errors="ignore",
+        on_bad_lines="skip",
+    )
+    return tbl.iloc[:, :n_cols], len(lines) - len(tbl)
+
+
 # ------------------------------------------------------------------------------
 # Function: parse_dat_file_both
 # ------------------------------------------------------------------------------
@@ -67,86 +127,81 @@ def parse_dat_file_both(filepath):
       - OCT lines (Hercules pitch/roll/heading)
       - VFR lines (Hercules lat/long with fix type SOLN_DEADRECK)
 
+    Parsing is fully vectorized: the file is read once as bytes, OCT/VFR lines
+    are selected by prefix, and each subset goes through pandas' C CSV
+    tokenizer plus one vectorized timestamp parse (no per-line regex or
+    strptime calls -- .DAT files commonly run to 10^5-10^6 lines).
+
     Returns two DataFrames:
       oct_df: columns=["Timestamp", "Heading", "Pitch", "Roll"]
       vfr_df: columns=["Timestamp", "Longitude", "Latitude"]
     """
-    # Regex for OCT lines
-    oct_pattern = re.compile(
-        r'^OCT\s+(\d{4}/\d{2}/\d{2})\s+(\d{2}:\d{2}:\d+\.\d+)\s+Hercules\s+'
-        r'[\-\d.]+\s+[\-\d.]+\s+[\-\d.]+\s+'
-        r'([\-\d.]+)\s+([\-\d.]+)\s+([\-\d.]+)\s+'
-        r'[\-\d.]+\s+[\-\d.]+\s+[\-\d.]+\s+'
-        r'([\-\d.]+)\s+([\-\d.]+)\s+([\-\d.]+)\s+'
-        r'([\-\d.]+)\s+([\-\d.]+)\s+([\-\d.]+)'
-    )
-    # Regex for VFR lines
-    vfr_pattern = re.compile(
-        r"^VFR\s+(\d{4}/\d{2}/\d{2})\s+(\d{2}:\d{2}:\d{2}\.\d+)\s+(\d+)\s+(\d+)\s+(\S+)\s+([-\d.]+)\s+([-\d.]+)"
-    )
+    # Record dispatch is a plain byte-prefix scan over an mmapped buffer --
+    # lines of other record types are never split, decoded, or regex-matched.
+    filepath = Path(filepath)
+    if filepath.stat().st_size == 0:
+        oct_lines, vfr_lines = [], []
+    else:
+        with filepath.open("rb") as fp, \
+                mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            oct_lines = _find_prefixed_lines(buf, b"OCT ")
+            vfr_lines = _find_prefixed_lines(buf, b"VFR ")
 
-    oct_data = []
-    vfr_data = []
     malformed_lines = 0
-
-    with filepath.open('r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            line_str = line.strip()
-            if not line_str:
-                continue
-
-            # Check for OCT match
-            oct_match = oct_pattern.match(line_str)
-            if oct_match:
-                date_str, time_str = oct_match.group(1), oct_match.group(2)
-                dt_str = f"{date_str} {time_str}"
-                try:
-                    try:
-                        dt = datetime.strptime(dt_str, "%Y/%m/%d %H:%M:%S.%f")
-                    except ValueError:
-                        dt = datetime.strptime(dt_str, "%Y/%m/%d %H:%M:%S")
-                except ValueError:
-                    malformed_lines += 1  # e.g. second field of 60+
-                    continue
-                dt = dt.replace(tzinfo=timezone.utc)
-                heading, pitch, roll = map(float, oct_match.group(3, 4, 5))
-                oct_data.append([dt, heading, pitch, roll])
-                continue
-
-            # Check for VFR match
-            vfr_match = vfr_pattern.match(line_str)
-            if vfr_match:
-                vehicle_number = vfr_match.group(4)
-                fix_type = vfr_match.group(5)
-                if vehicle_number != "0" or fix_type != "SOLN_DEADRECK":
-                    continue
-                date_str, time_str = vfr_match.group(1), vfr_match.group(2)
-                dt_str = f"{date_str} {time_str}"
-                try:
-                    try:
-                        dt = datetime.strptime(dt_str, "%Y/%m/%d %H:%M:%S.%f")
-                    except ValueError:
-                        dt = datetime.strptime(dt_str, "%Y/%m/%d %H:%M:%S")
-                except ValueError:
-                    malformed_lines += 1
-                    continue
-                dt = dt.replace(tzinfo=timezone.utc)
-                lon_str = vfr_match.group(6)
-                lat_str = vfr_match.group(7)
-                try:
-                    lon_val = float(lon_str)
-                    lat_val = float(lat_str)
-                    if abs(lon_val) < 1 and abs(lat_val) < 1:
-                        continue
-                except ValueError:
-                    continue
-                vfr_data.append([dt, lon_str, lat_str])
+    layout_skipped = 0
+
+    # --- OCT: OCT date time Hercules + 15 numeric fields -------------------
+    # Field layout (0-based token index): 3 skip, heading/pitch/roll at 7-9,
+    # then 9 more numeric fields whose presence validates the record.
+    oct_df = pd.DataFrame(columns=["Timestamp", "Heading", "Pitch", "Roll"])
+    if oct_lines:
+        tbl, skipped = _read_whitespace_table(oct_lines, 19)
+        layout_skipped += skipped
+        valid = tbl[3] == "Hercules"
+        numeric = tbl.loc[:, 4:18].apply(pd.to_numeric, errors="coerce")
+        valid &= numeric.notna().all(axis=1)
+        tbl = tbl[valid]
+        numeric = numeric[valid]
+        if not tbl.empty:
+            ts = parse_timestamps_vectorized(tbl[1], tbl[2])
+            malformed_lines += int(ts.isna().sum())
+            ok = ts.notna()
+            oct_df = pd.DataFrame({
+                "Timestamp": ts[ok],
+                "Heading": numeric.loc[ok, 7],
+                "Pitch": numeric.loc[ok, 8],
+                "Roll": numeric.loc[ok, 9],
+            }).reset_index(drop=True)
+
+    # --- VFR: VFR date time seq vehicle fix_type lon lat --------------------
+    vfr_df = pd.DataFrame(columns=["Timestamp", "Longitude", "Latitude"])
+    if vfr_lines:
+        tbl, skipped = _read_whitespace_table(vfr_lines, 8)
+        layout_skipped += skipped
+        lon = pd.to_numeric(tbl[6], errors="coerce")
+        lat = pd.to_numeric(tbl[7], errors="coerce")
+        valid = (
+            (tbl[4] == "0") & (tbl[5] == "SOLN_DEADRECK")
+            & lon.notna() & lat.notna()
+            # Reject near-(0, 0) fixes ("null island" dead-reckon resets).
+            & ~((lon.abs() < 1) & (lat.abs() < 1))
+        )
+        tbl = tbl[valid]
+        if not tbl.empty:
+            ts = parse_timestamps_vectorized(tbl[1], tbl[2])
+            malformed_lines += int(ts.isna().sum())
+            ok = ts.notna()
+            vfr_df = pd.DataFrame({
+                "Timestamp": ts[ok],
+                "Longitude": lon[valid][ok],
+                "Latitude": lat[valid][ok],
+            }).reset_index(drop=True)
 
     if malformed_lines:
-        print(f"  - Skipped {malformed_lines} lines with unparseable timestamps in {filepath.name}")
+        print(f"  - Skipped {malformed_lines} lines with unparseable timestamps in {Path(filepath).name}")
+    if layout_skipped:
+        print(f"  - Skipped {layout_skipped} lines with too many fields in {Path(filepath).name}")
 
-    oct_df = pd.DataFrame(oct_data, columns=["Timestamp", "Heading", "Pitch", "Roll"])
-    vfr_df = pd.DataFrame(vfr_data, columns=["Timestamp", "Longitude", "Latitude"])
     return oct_df, vfr_df
 
 # ------------------------------------------------------------------------------
@@ -164,21 +219,46 @@ def process_all_dat_files_both(root_dir):
         raise FileNotFoundError(f"NavEst directory not found at {navest_dir}")
 
     all_files = list(navest_dir.glob("*.dat")) + list(navest_dir.glob("*.DAT"))
-    all_oct = pd.DataFrame()
-    all_vfr = pd.DataFrame()
 
-    for filepath in all_files:
-        oct_df, vfr_df = parse_dat_file_both(filepath)
+    # Reruns skip the parsing phase entirely when no .DAT file changed: the
+    # combined frames are cached as Feather keyed on the input fingerprint.
+    cache_dir = root_dir / "RUMI_processed" / ".cache"
+    key = file_set_fingerprint(all_files)
+    cached_oct = load_ingest_cache(cache_dir, "dat_oct", key)
+    cached_vfr = load_ingest_cache(cache_dir, "dat_vfr", key)
+    if cached_oct is not None and cached_vfr is not None:
+        print(f"  - Using cached .DAT ingest ({len(all_files)} files unchanged)")
+        return cached_oct, cached_vfr
+
+    # Each file parses independently and the work is CPU-bound, so spread the
+    # files across a process pool (a single file is not worth the pool spin-up).
+    if len(all_files) > 1:
+        with ProcessPoolExecutor() as pool:
+            results = list(pool.map(parse_dat_file_both, all_files))
+    else:
+        results = [parse_dat_file_both(f) for f in all_files]
+
+    # Collect per-file frames and concatenate once -- concatenating inside the
+    # loop recopies the accumulated rows for every file (quadratic in total rows).
+    oct_frames = []
+    vfr_frames = []
+    for oct_df, vfr_df in results:
         if not oct_df.empty:
-            all_oct = pd.concat([all_oct, oct_df], ignore_index=True)
+            oct_frames.append(oct_df)
         if not vfr_df.empty:
-            all_vfr = pd.concat([all_vfr, vfr_df], ignore_index=True)
+            vfr_frames.append(vfr_df)
+
+    all_oct = pd.concat(oct_frames, ignore_index=True) if oct_frames else pd.DataFrame()
+    all_vfr = pd.concat(vfr_frames, ignore_index=True) if vfr_frames else pd.DataFrame()
 
     if not all_oct.empty:
         all_oct.sort_values("Timestamp", inplace=True)
     if not all_vfr.empty:
         all_vfr.sort_values("Timestamp", inplace=True)
 
+    save_ingest_cache(cache_dir, "dat_oct", key, all_oct)
+    save_ingest_cache(cache_dir, "dat_vfr", key, all_vfr)
+
     return all_oct, all_vfr
 
 # ------------------------------------------------------------------------------
@@ -221,10 +301,9 @@ def process_dive_vehicle_rows_oct(dive_info, oct_data):
     if expected_seconds < 0:
         return pd.DataFrame(), 0, 0, 0, 0
 
-    df_sub = oct_data[
-        (oct_data["Timestamp"] >= launch) &
-        (oct_data["Timestamp"] <= recovery)
-        ].copy()
+    # oct_data is sorted by Timestamp, so a binary-search slice beats a full
+    # boolean scan per dive.
+    df_sub = slice_time_window(oct_data, launch, recovery)
 
     if df_sub.empty:
         return pd.DataFrame(), 0, 0, 0, expected_seconds
@@ -254,7 +333,7 @@ def output_dive_csv_oct(root_dir, expedition_name, dive_id, df):
 
     fname = f"{expedition_name}_{dive_id}_pitch_roll_heading_octans.csv"
     outpath = outdir / fname
-    df_final.to_csv(outpath, index=False)
+    write_csv(df_final, outpath)
     print(f"Saved OCT data to: {outpath}")
     return outpath
 
@@ -277,10 +356,8 @@ def process_dive_vehicle_rows_latlong(dive_info, vfr_data):
         return pd.DataFrame(), 0, 0, 0, 0
 
     expected_seconds = int((off_bottom - on_bottom).total_seconds())
-    df_sub = vfr_data[
-        (vfr_data["Timestamp"] >= on_bottom) &
-        (vfr_data["Timestamp"] <= off_bottom)
-        ].copy()
+    # vfr_data is sorted by Timestamp; see process_dive_vehicle_rows_oct.
+    df_sub = slice_time_window(vfr_data, on_bottom, off_bottom)
 
     if df_sub.empty:
         return pd.DataFrame(), 0, 0, 0, expected_seconds
@@ -317,7 +394,7 @@ def output_dive_csv_latlong(root_dir, expedition_name, dive_id, df):
 
     fname = f"{expedition_name}_{dive_id}_dvl_lat_long.csv"
     outpath = outdir / fname
-    df_final.to_csv(outpath, index=False)
+    write_csv(df_final, outpath)
     print(f"Saved DVL lat/long data to: {outpath}")
     return outpath
 
@@ -372,6 +449,11 @@ def process_data(root_dir):
     total_vfr_fixes = 0
     total_vfr_expected = 0
 
+    # CSV writes are disk-bound; push them onto a small thread pool so the
+    # next dive's filtering proceeds while the previous dive's files flush.
+    write_pool = ThreadPoolExecutor(max_workers=4)
+    write_futures = []
+
     for _, row in ds.iterrows():
         expedition = str(row.get("expedition", "NA")).strip()
         dive_id = str(row.get("dive", "UNKNOWN")).strip()
@@ -379,7 +461,8 @@ def process_data(root_dir):
         df_oct, orig_oct, final_oct, dup_oct, exp_oct = process_dive_vehicle_rows_oct(row, all_oct)
         total_oct_expected += exp_oct
         if not df_oct.empty:
-            output_dive_csv_oct(root_dir, expedition, dive_id, df_oct)
+            write_futures.append(
+                write_pool.submit(output_dive_csv_oct, root_dir, expedition, dive_id, df_oct))
             total_oct_fixes += final_oct
             coverage_oct = (final_oct / exp_oct * 100) if exp_oct else 0
             print(f"\n(OCT) Dive {dive_id} Summary:")
@@ -399,7 +482,8 @@ def process_data(root_dir):
         df_vfr, orig_vfr, final_vfr, dup_vfr, exp_vfr = process_dive_vehicle_rows_latlong(row, all_vfr)
         total_vfr_expected += exp_vfr
         if not df_vfr.empty:
-            output_dive_csv_latlong(root_dir, expedition, dive_id, df_vfr)
+            write_futures.append(
+                write_pool.submit(output_dive_csv_latlong, root_dir, expedition, dive_id, df_vfr))
             total_vfr_fixes += final_vfr
             coverage_vfr = (final_vfr / exp_vfr * 100) if exp_vfr else 0
             print(f"\n(LAT/LONG) Dive {dive_id} Summary:")
@@ -416,6 +500,11 @@ def process_data(root_dir):
             print(f"WARNING: Dive {dive_id}: No VFR data within the On Bottom/Off Bottom window.")
             report.warn("no-data", f"dive {dive_id}: no DVL data in the on-bottom window")
 
+    # Wait for the queued writes and surface any write error before reporting.
+    write_pool.shutdown(wait=True)
+    for future in write_futures:
+        future.result()
+
     print("\n=== Processing Complete! ===")
     print(f"* OCT total expected: {total_oct_expected} seconds, total fixes: {total_oct_fixes}")
     print(f"* VFR total expected: {total_vfr_expected} seconds, total fixes: {total_vfr_fixes}")
@@ -1,10 +1,27 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
 import pandas as pd
 import csv
 
-from processors.common import drop_duplicate_timestamps
+from processors.common import drop_duplicate_timestamps, to_iso8601, write_csv
 from processors.report import RunReport
 
+# Sealog export columns the pipeline keeps, in canonical output order ("ts"
+# becomes Timestamp). Built once at import; load_sealog_file pushes the
+# intersection with each file's header into read_csv as usecols so the parser
+# never tokenizes the many unused Sealog fields.
+SEALOG_DESIRED_COLUMNS = (
+    "ts", "event_value", "event_free_text", "event_option.channel", "event_option.milestone",
+    "event_option.rating", "event_option.vehicle", "vehicleRealtimeDualHDGrabData.camera_name_2_uom",
+    "vehicleRealtimeDualHDGrabData.camera_name_2_value", "vehicleRealtimeDualHDGrabData.camera_name_uom",
+    "vehicleRealtimeDualHDGrabData.camera_name_value", "vehicleRealtimeDualHDGrabData.filename_2_uom",
+    "vehicleRealtimeDualHDGrabData.filename_2_value", "vehicleRealtimeDualHDGrabData.filename_uom",
+    "vehicleRealtimeDualHDGrabData.filename_value",
+)
+SEALOG_DESIRED = frozenset(SEALOG_DESIRED_COLUMNS)
+
 # ------------------------------------------------------------------------------
 # Function: get_file_paths
 # ------------------------------------------------------------------------------
@@ -51,17 +68,8 @@ def get_file_paths(base_directory, dive_number):
 # Function: to_iso8601_str
 # ------------------------------------------------------------------------------
 def to_iso8601_str(dt_series):
-    """
-    Converts a Pandas Series of datetime values to ISO8601 format with a 'Z' suffix to indicate UTC.
-
-    Parameters:
-      dt_series (pd.Series): Series containing datetime values.
-
-    Returns:
-      pd.Series: Series where each datetime is converted to a string in the format:
-                 "YYYY-MM-DDTHH:MM:SSZ".
-    """
-    return dt_series.dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    """Shared vectorized ISO8601 formatting (see processors.common)."""
+    return to_iso8601(dt_series)
 
 # ------------------------------------------------------------------------------
 # Function: load_tsv_file
@@ -91,7 +99,13 @@ def load_tsv_file(file_path, sensor_name=None, enforce_negative=False, column_na
     if not file_path.exists():
         return None
     try:
-        df = pd.read_csv(file_path, sep="\t", header=None, quoting=csv.QUOTE_MINIMAL)
+        # Arrow's multi-threaded CSV reader is several times faster than the
+        # default engine on the sampled TSVs; fall back to the C engine for
+        # anything Arrow rejects (e.g. ragged rows).
+        try:
+            df = pd.read_csv(file_path, sep="\t", header=None, engine="pyarrow")
+        except Exception:
+            df = pd.read_csv(file_path, sep="\t", header=None, quoting=csv.QUOTE_MINIMAL)
 
         # If column_names are provided, enforce the expected number of columns.
         if column_names:
@@ -105,21 +119,45 @@ def load_tsv_file(file_path, sensor_name=None, enforce_negative=False, column_na
             # If no column names provided, create default names based on sensor_name.
             df.columns = ["Timestamp"] + [f"{sensor_name}_{i + 1}" for i in range(df.shape[1] - 1)]
 
-        # Convert the Timestamp column to datetime in UTC.
-        df["Timestamp"] = pd.to_datetime(df["Timestamp"].astype(str).str.strip(), utc=True, errors="coerce")
-
-        # Optionally enforce negative values for sensor columns.
+        # Convert the Timestamp column to datetime in UTC. The Arrow reader
+        # already yields datetime64 for ISO8601 columns; only string columns
+        # need the strip-and-parse path.
+        if df["Timestamp"].dtype.kind == "M":
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True)
+        else:
+            # Sampled TSVs use one fixed ISO variant throughout a file, so
+            # detect subseconds from the first value and parse the column on
+            # the vectorized strptime kernel; errors="coerce" with no format
+            # would fall back to slow per-element inference. Non-uniform
+            # files drop back to the coercing generic parser. (The parser
+            # tolerates surrounding whitespace, so no astype(str).str.strip()
+            # copies are needed.)
+            ts = df["Timestamp"]
+            first = str(ts.iloc[0]) if len(ts) else ""
+            fmt = "%Y-%m-%dT%H:%M:%S.%fZ" if "." in first else "%Y-%m-%dT%H:%M:%SZ"
+            try:
+                df["Timestamp"] = pd.to_datetime(ts, format=fmt, utc=True, cache=True)
+            except (ValueError, TypeError):
+                df["Timestamp"] = pd.to_datetime(ts, utc=True, errors="coerce")
+
+        # Optionally enforce negative values for sensor columns: one numpy
+        # pass over the 2-D block instead of a Series op per column. The copy
+        # is required -- under Copy-on-Write, to_numpy() returns a read-only
+        # view and in-place ufuncs on it raise.
         if enforce_negative:
-            for col in df.columns[1:]:
-                df[col] = -df[col].abs()
+            arr = df.iloc[:, 1:].to_numpy(copy=True)
+            np.abs(arr, out=arr)
+            np.negative(arr, out=arr)
+            df.iloc[:, 1:] = arr
 
         # Optionally drop the Temperature column.
         if drop_temperature and "Temperature" in df.columns:
             df = df.drop(columns=["Temperature"], errors="ignore")
 
-        # Remove duplicate timestamps
+        # Remove duplicate timestamps and sort chronologically; downstream
+        # joins take the monotonic fast path when both sides are sorted.
         orig_len = len(df)
-        df = df.drop_duplicates(subset=["Timestamp"])
+        df = df.drop_duplicates(subset=["Timestamp"]).sort_values("Timestamp", kind="mergesort")
         dupes_removed = orig_len - len(df)
         if dupes_removed > 0:
             print(f"Removed {dupes_removed} duplicate timestamps from {file_path.name}")
@@ -154,44 +192,52 @@ def load_sealog_file(file_path):
     if not file_path.exists():
         return None
     try:
-        desired_columns = [
-            "ts", "event_value", "event_free_text", "event_option.channel", "event_option.milestone",
-            "event_option.rating", "event_option.vehicle", "vehicleRealtimeDualHDGrabData.camera_name_2_uom",
-            "vehicleRealtimeDualHDGrabData.camera_name_2_value", "vehicleRealtimeDualHDGrabData.camera_name_uom",
-            "vehicleRealtimeDualHDGrabData.camera_name_value", "vehicleRealtimeDualHDGrabData.filename_2_uom",
-            "vehicleRealtimeDualHDGrabData.filename_2_value", "vehicleRealtimeDualHDGrabData.filename_uom",
-            "vehicleRealtimeDualHDGrabData.filename_value"
-        ]
-        df = pd.read_csv(file_path, low_memory=False, quoting=csv.QUOTE_MINIMAL)
+        # One header-only read determines which desired columns this export
+        # actually has; the full parse then skips every other column at
+        # tokenize time instead of materializing and dropping them.
+        header_cols = pd.read_csv(file_path, nrows=0).columns
+        usecols = [c for c in header_cols if c in SEALOG_DESIRED or c == "Timestamp"]
+        try:
+            df = pd.read_csv(file_path, engine="pyarrow", usecols=usecols)
+        except Exception:
+            df = pd.read_csv(file_path, low_memory=False, quoting=csv.QUOTE_MINIMAL,
+                             usecols=usecols)
         print(f"Loaded {len(df)} rows from Sealog: {file_path}")
 
         # Rename "ts" to "Timestamp" if present
         if "ts" in df.columns:
             df = df.rename(columns={"ts": "Timestamp"})
 
-        # Retain only the desired columns that are available.
-        available = [col for col in desired_columns if col in df.columns]
-        if "Timestamp" not in available and "Timestamp" in df.columns:
-            available = ["Timestamp"] + available
-        df = df[available]
-
-        # Parse the Timestamp column
-        ts_str = df["Timestamp"].astype(str).str.strip()
-        try:
-            df["Timestamp"] = pd.to_datetime(ts_str, format="%Y-%m-%dT%H:%M:%S.%fZ", utc=True)
-        except Exception:
-            df["Timestamp"] = pd.to_datetime(ts_str, utc=True, errors="coerce")
+        # Restore the canonical column order (Timestamp first).
+        order = ["Timestamp" if c == "ts" else c for c in SEALOG_DESIRED_COLUMNS]
+        df = df[[c for c in order if c in df.columns]]
 
-        # Round timestamps to nearest second
-        df["Timestamp"] = df["Timestamp"].dt.round("s")
-
-        # Keep only event_value == 'FREE_FORM' or 'HIGHLIGHT'
+        # Keep only event_value == 'FREE_FORM' or 'HIGHLIGHT'. Applied before
+        # the timestamp parse/round/dedup so those passes only touch rows that
+        # survive (the pandas equivalent of scan-time predicate pushdown).
         if "event_value" in df.columns:
             df = df[df["event_value"].isin(["FREE_FORM", "HIGHLIGHT"])]
 
-        # Remove duplicate timestamps
+        # Parse the Timestamp column (already datetime64 when the Arrow
+        # reader recognized the ISO8601 column).
+        if df["Timestamp"].dtype.kind == "M":
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True)
+        else:
+            # format="ISO8601" takes pandas' vectorized C parsing path and
+            # accepts both the subsecond and whole-second variants in one
+            # call; it also tolerates surrounding whitespace, so the column
+            # is passed straight in without an astype(str).str.strip() copy.
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"], format="ISO8601",
+                                             utc=True, cache=True, errors="coerce")
+
+        # Round timestamps to nearest second (project rule: round, never
+        # truncate, so an astype("datetime64[s]") floor is not an option).
+        df["Timestamp"] = df["Timestamp"].dt.round("s")
+
+        # Remove duplicate timestamps and sort chronologically (keeps the
+        # merge step on the sorted-index fast path).
         orig_len = len(df)
-        df = df.drop_duplicates(subset=["Timestamp"])
+        df = df.drop_duplicates(subset=["Timestamp"]).sort_values("Timestamp", kind="mergesort")
         dupes_removed = orig_len - len(df)
         if dupes_removed > 0:
             print(f"Removed {dupes_removed} duplicate timestamps from Sealog file")
@@ -212,7 +258,7 @@ def remove_timestamp_duplicates(df):
 # ------------------------------------------------------------------------------
 # Function: process_single_dive
 # ------------------------------------------------------------------------------
-def process_single_dive(root_dir, expedition, dive_number, report=None):
+def process_single_dive(root_dir, expedition, dive_number, report=None, force=False):
     """
     Processes a single dive by merging various sensor datasets and saving the merged output.
 
@@ -237,6 +283,32 @@ def process_single_dive(root_dir, expedition, dive_number, report=None):
     # Get file paths for the dive datasets.
     paths = get_file_paths(root_dir, dive_number)
 
+    # Resume support: skip the dive when its outputs already exist and are
+    # newer than every input that feeds them. Turns a rerun over N dives into
+    # work proportional to the dives that actually changed.
+    herc_output_path = dive_output_dir / f"{expedition}_{dive_number}_sealog_sensors_merged.csv"
+    atalanta_output_path = dive_output_dir / f"{expedition}_{dive_number}_USBL_Atalanta.csv"
+    if not force:
+        nav_path = paths["sampled_dir"] / f"{dive_number}.NAV.M2.sampled.tsv"
+        input_paths = [
+            paths["ctd"], paths["sealog"],
+            paths["sampled_dir"] / f"{dive_number}.DEP1.sampled.tsv",
+            paths["sampled_dir"] / f"{dive_number}.O2S.sampled.tsv",
+            nav_path,
+        ]
+        existing_inputs = [p for p in input_paths if p.exists()]
+        outputs_needed = [herc_output_path]
+        if nav_path.exists():
+            outputs_needed.append(atalanta_output_path)
+        if existing_inputs and all(o.exists() for o in outputs_needed):
+            newest_input = max(p.stat().st_mtime for p in existing_inputs)
+            if all(o.stat().st_mtime > newest_input for o in outputs_needed):
+                print(f"Skipping dive {dive_number}: outputs newer than all inputs.")
+                if report:
+                    report.info("resume",
+                                f"dive {dive_number}: outputs up to date; not reprocessed")
+                return
+
     # Define expected column names for the CTD and O2S datasets.
     ctd_columns = ["Temperature", "Conductivity", "Pressure", "Salinity", "Sound_Velocity"]
     o2s_columns = ["O2_Concentration", "O2_Saturation"]
@@ -274,20 +346,40 @@ def process_single_dive(root_dir, expedition, dive_number, report=None):
     # -------------------------------------------------------------------
     # Merge for Hercules: CTD + Sealog + Herc_Depth + O2S
     # -------------------------------------------------------------------
-    herc_merged = ctd_df.copy()
+    # Join every auxiliary stream onto the CTD timeline in one pass. The old
+    # merge-per-stream loop rebuilt the hash table on Timestamp and copied all
+    # previously merged columns once per stream.
+    aux_frames = []
     for df in [sealog_df, herc_df, o2s_df]:
         if df is not None:
-            df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True, errors="coerce")
-            herc_merged = herc_merged.merge(df, on="Timestamp", how="left")
+            # The loaders already return datetime64 UTC Timestamps; only
+            # coerce if a frame somehow arrives unparsed.
+            if df["Timestamp"].dtype.kind != "M":
+                df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True, errors="coerce")
+            aux_frames.append(df.set_index("Timestamp"))
+    if aux_frames:
+        herc_merged = ctd_df.set_index("Timestamp").join(aux_frames, how="left").reset_index()
+    else:
+        # ctd_df is not referenced again, so no defensive copy is needed.
+        herc_merged = ctd_df
 
     herc_merged, dupes_removed_herc = remove_timestamp_duplicates(herc_merged)
     if dupes_removed_herc > 0:
         print(f"Final check: Removed {dupes_removed_herc} duplicate timestamps from Hercules merged data")
 
     herc_merged["Timestamp"] = to_iso8601_str(herc_merged["Timestamp"])
-    herc_output_path = dive_output_dir / f"{expedition}_{dive_number}_sealog_sensors_merged.csv"
-    herc_merged.to_csv(herc_output_path, index=False, quoting=csv.QUOTE_ALL)
+    write_csv(herc_merged, herc_output_path, quote_all=True)
     print(f"Saved Hercules merged sensor data: {herc_output_path}")
+
+    # Parquet sidecar with just the camera-filename column, so the stillcam
+    # stage can read the one column it needs without re-parsing the CSV.
+    filename_col = "vehicleRealtimeDualHDGrabData.filename_value"
+    if filename_col in herc_merged.columns:
+        try:
+            herc_merged[[filename_col]].to_parquet(
+                herc_output_path.with_suffix(".parquet"), compression="zstd")
+        except Exception as e:
+            print(f"Warning: could not write parquet sidecar for {herc_output_path.name}: {e}")
     if report:
         report.add_output(herc_output_path, rows=len(herc_merged))
         if sealog_df is None:
@@ -320,8 +412,7 @@ def process_single_dive(root_dir, expedition, dive_number, report=None):
         atalanta_df["Timestamp"] = to_iso8601_str(atalanta_df["Timestamp"])
 
         # Save only these columns (Timestamp, Lat, Long, Depth) to CSV
-        atalanta_output_path = dive_output_dir / f"{expedition}_{dive_number}_USBL_Atalanta.csv"
-        atalanta_df.to_csv(atalanta_output_path, index=False, quoting=csv.QUOTE_ALL)
+        write_csv(atalanta_df, atalanta_output_path, quote_all=True)
         print(f"Saved Atalanta sensor data: {atalanta_output_path}")
     else:
         print("No Atalanta data available for this dive.")
@@ -331,10 +422,25 @@ def process_single_dive(root_dir, expedition, dive_number, report=None):
     print(f"  - Initial CTD rows: {initial_rows}")
     print(f"  - Final Hercules merged file rows: {final_rows_herc}")
 
+# ------------------------------------------------------------------------------
+# Function: _process_dive_task
+# ------------------------------------------------------------------------------
+def _process_dive_task(args):
+    """
+    Worker entry point: processes one dive and returns its RunReport so the
+    parent can fold the events/outputs into the stage-level report. Each dive
+    reads and writes disjoint paths, so workers need no coordination.
+    """
+    root_dir, expedition, dive_num, force = args
+    print(f"Processing dive {dive_num}...")
+    worker_report = RunReport("sensors_sealog")
+    process_single_dive(root_dir, expedition, dive_num, report=worker_report, force=force)
+    return worker_report
+
 # ------------------------------------------------------------------------------
 # Function: process_data
 # ------------------------------------------------------------------------------
-def process_data(root_dir):
+def process_data(root_dir, force=False, jobs=None):
     """
     Main processing function for dive sensor and Sealog data.
 
@@ -361,13 +467,18 @@ def process_data(root_dir):
         valid_dives = set(summary_df["dive"].astype(str).str.upper().str.strip())
         dive_reports_dir = root_dir / "processed" / "dive_reports"
 
-        all_dives = [
-            item.name.upper()
-            for item in dive_reports_dir.iterdir()
-            if item.is_dir() and item.name.upper().startswith("H")
-        ]
-
-        dive_list = [d for d in all_dives if d in valid_dives]
+        # scandir DirEntry objects carry the file type from the directory
+        # read itself, so is_dir() costs no extra stat per entry.
+        with os.scandir(dive_reports_dir) as entries:
+            all_dives = [
+                entry.name.upper()
+                for entry in entries
+                if entry.is_dir(follow_symlinks=False) and entry.name.upper().startswith("H")
+            ]
+
+        # Set intersection, sorted so dives always process in a stable order
+        # regardless of directory enumeration order.
+        dive_list = sorted(valid_dives.intersection(all_dives))
         if not dive_list:
             print("No valid dives found in dive summaries. Cannot process sensor data.")
             return
@@ -376,9 +487,21 @@ def process_data(root_dir):
         return
 
     report = RunReport("sensors_sealog", root_dir / "RUMI_processed")
-    for dive_num in dive_list:
-        print(f"Processing dive {dive_num}...")
-        process_single_dive(root_dir, expedition, dive_num, report=report)
+
+    # Dives are fully independent (separate inputs, separate output folders),
+    # so run them across a process pool; a single dive skips the pool spin-up.
+    tasks = [(root_dir, expedition, dive_num, force) for dive_num in dive_list]
+    if len(tasks) > 1:
+        workers = min(len(tasks), jobs or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            worker_reports = list(pool.map(_process_dive_task, tasks))
+    else:
+        worker_reports = [_process_dive_task(task) for task in tasks]
+
+    for worker_report in worker_reports:
+        report.inputs.extend(worker_report.inputs)
+        report.outputs.extend(worker_report.outputs)
+        report.events.extend(worker_report.events)
     report.finalize()
 
 # ------------------------------------------------------------------------------
@@ -1,11 +1,35 @@
 # processors/stillcam_images.py
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import os
 import pandas as pd
 from PIL import Image
 from datetime import datetime
 
 from processors.report import RunReport
 
+def _convert_png(args):
+    """
+    Converts one source PNG to a 1280x720 JPEG (80% quality).
+
+    Worker function for the conversion pool: returns None on success, or an
+    error message string for the parent to count and print.
+    """
+    source_png_path, jpg_path = args
+    try:
+        with Image.open(source_png_path) as img:
+            # draft() asks decoders that support scaled decode (JPEG) to skip
+            # the full-resolution pass; it is a safe no-op for PNG sources.
+            img.draft("RGB", (1280, 720))
+            # reducing_gap lets Pillow box-reduce the image close to the
+            # target size first, so Lanczos only runs on a fraction of the
+            # source pixels (4K -> 720p is a >5x reduction).
+            img = img.resize((1280, 720), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            img.save(jpg_path, "JPEG", quality=80)
+        return None
+    except Exception as e:
+        return f"Error converting {source_png_path}: {e}"
+
 def process_data(root_dir):
     """
     Processes merged Sealog CSV files to locate camera image filenames,
@@ -40,6 +64,12 @@ def process_data(root_dir):
         print(f"'{rumi_processed_dir}' not found; nothing to process.")
         return
 
+    # Walk processed/capture_pngs/ once and index every PNG by basename, so
+    # each reference costs a dict lookup instead of a stat syscall against a
+    # reconstructed capture_YYYYMMDD path.
+    capture_dir = root_dir / "processed" / "capture_pngs"
+    png_index = {p.name: p for p in capture_dir.rglob("*.png")} if capture_dir.exists() else {}
+
     # Counters for final summary
     total_csvs_examined = 0
     total_rows_examined = 0
@@ -49,6 +79,10 @@ def process_data(root_dir):
     total_converted = 0
     total_already_done = 0
 
+    # (source_png, target_jpg) pairs gathered during the CSV scan; converted
+    # in one parallel batch at the end.
+    conversion_tasks = []
+
     # Iterate over each dive folder in RUMI_processed
     for dive_path in rumi_processed_dir.iterdir():
         if not dive_path.is_dir():
@@ -62,70 +96,93 @@ def process_data(root_dir):
         for csv_path in csv_files:
             total_csvs_examined += 1
             print(f"\n[Stillcam] Processing merged CSV: {csv_path}")
-            try:
-                df = pd.read_csv(csv_path)
-            except Exception as e:
-                print(f"  Error reading '{csv_path}': {e}")
-                continue
-
             filename_col = "vehicleRealtimeDualHDGrabData.filename_value"
-            if filename_col not in df.columns:
-                print(f"  Column '{filename_col}' not found. Skipping.")
-                continue
-
-            # Create an output dir for stillcam images, e.g. RUMI_processed/<dive>/stillcam_images/
-            stillcam_dir = dive_path / "stillcam_images"
-            stillcam_dir.mkdir(exist_ok=True)
-
-            # Process each row that has a PNG path
-            for idx, row in df.iterrows():
-                total_rows_examined += 1
-                png_path = row.get(filename_col, "")
-                if not isinstance(png_path, str) or not png_path.lower().endswith(".png"):
-                    continue
 
-                total_png_references += 1
-
-                # e.g. /data/sealog-vehicle-files/images/cam1_20231031185717.png
-                png_path_obj = Path(png_path)
-                basename = png_path_obj.name
-
-                # Attempt to parse the datetime from the filename's last underscore
-                # e.g. "cam1_20231031185717.png" -> "20231031185717"
+            # Prefer the Parquet sidecar written by sensors_sealog: it holds
+            # just the filename column and skips re-parsing the whole CSV.
+            df = None
+            parquet_path = csv_path.with_suffix(".parquet")
+            if parquet_path.exists():
+                try:
+                    df = pd.read_parquet(parquet_path, columns=[filename_col])
+                except Exception as e:
+                    print(f"  Ignoring unreadable sidecar '{parquet_path.name}': {e}")
+                    df = None
+            if df is None:
                 try:
-                    datetime_part = basename.split("_")[-1].replace(".png", "")
-                    dt = datetime.strptime(datetime_part, "%Y%m%d%H%M%S")
+                    # Only the filename column matters here; usecols lets the
+                    # parser skip tokenizing the other ~15 columns.
+                    df = pd.read_csv(csv_path, usecols=[filename_col])
                 except ValueError:
-                    total_parse_errors += 1
-                    print(f"  Could not parse datetime from filename: {basename}")
+                    print(f"  Column '{filename_col}' not found. Skipping.")
+                    continue
+                except Exception as e:
+                    print(f"  Error reading '{csv_path}': {e}")
                     continue
 
-                # Build the source PNG path under processed/capture_pngs/capture_YYYYMMDD/<basename>
-                date_subdir = dt.strftime("capture_%Y%m%d")
-                source_png_path = root_dir / "processed" / "capture_pngs" / date_subdir / basename
+            # Create an output dir for stillcam images, e.g. RUMI_processed/<dive>/stillcam_images/
+            stillcam_dir = dive_path / "stillcam_images"
+            stillcam_dir.mkdir(exist_ok=True)
 
-                if not source_png_path.exists():
+            # Pull the PNG references out of the column in one vectorized pass
+            # (iterrows built a Series per row just to read one cell).
+            total_rows_examined += len(df)
+            names = df[filename_col].dropna().astype(str)
+            png_refs = names[names.str.lower().str.endswith(".png")]
+            total_png_references += len(png_refs)
+
+            # Sealog repeats the same grab filename on consecutive rows (it
+            # only changes when the camera fires), so deduplicate to decode
+            # each referenced image exactly once.
+            png_refs = png_refs.drop_duplicates()
+
+            # Validate the capture datetime embedded after the last underscore,
+            # e.g. "cam1_20231031185717.png" -> "20231031185717", in one
+            # vectorized parse instead of strptime per filename (the index
+            # locates the file; this keeps the parse-error count). to_datetime
+            # rolls an out-of-range seconds field into the next minute instead
+            # of rejecting it like strptime, so mask that case explicitly.
+            basenames = png_refs.map(lambda p: Path(p).name)
+            stamps = basenames.str.rsplit("_", n=1).str[-1].str.replace(".png", "", regex=False)
+            parsed = pd.to_datetime(stamps, format="%Y%m%d%H%M%S", errors="coerce")
+            secs = pd.to_numeric(stamps.str[12:14], errors="coerce")
+            parsed[(secs >= 60) | secs.isna()] = pd.NaT
+
+            bad_names = basenames[parsed.isna()]
+            total_parse_errors += len(bad_names)
+            for basename in bad_names:
+                print(f"  Could not parse datetime from filename: {basename}")
+
+            for basename in basenames[parsed.notna()]:
+                # Look the basename up in the one-time capture_pngs index.
+                source_png_path = png_index.get(basename)
+                if source_png_path is None:
                     total_missing_pngs += 1
-                    print(f"  Source PNG not found: {source_png_path}")
+                    print(f"  Source PNG not found under {capture_dir}: {basename}")
                     continue
 
                 # Resume support: skip images already converted in a prior run.
-                jpg_name = png_path_obj.stem + ".jpg"
+                jpg_name = Path(basename).stem + ".jpg"
                 jpg_path = stillcam_dir / jpg_name
                 if jpg_path.exists():
                     total_already_done += 1
                     continue
 
-                # Convert the PNG to 1280x720 JPEG (80% quality)
-                try:
-                    with Image.open(source_png_path) as img:
-                        img = img.resize((1280, 720), Image.Resampling.LANCZOS)
-                        img.save(jpg_path, "JPEG", quality=80)
-                        total_converted += 1
-                        print(f"  Saved resized image: {jpg_path}")
-                except Exception as e:
+                conversion_tasks.append((source_png_path, jpg_path))
+
+    # Decode/resize/encode is CPU-bound, so fan the queued conversions out
+    # over a process pool instead of converting inline one row at a time.
+    if conversion_tasks:
+        workers = min(len(conversion_tasks), os.cpu_count() or 1)
+        print(f"\n[Stillcam] Converting {len(conversion_tasks)} images "
+              f"across {workers} workers...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for error in pool.map(_convert_png, conversion_tasks, chunksize=8):
+                if error is None:
+                    total_converted += 1
+                else:
                     total_parse_errors += 1
-                    print(f"  Error converting {source_png_path}: {e}")
+                    print(f"  {error}")
 
     # Final summary after all dives
     print("\n------------------ Stillcam Summary ------------------")
@@ -1,11 +1,73 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import os
 import re
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta, timezone
-
-from processors.common import best_fix_per_second, drop_duplicate_timestamps
+from datetime import datetime, timezone
+
+from processors.common import (
+    best_fix_per_second,
+    drop_duplicate_timestamps,
+    file_set_fingerprint,
+    load_ingest_cache,
+    save_ingest_cache,
+    slice_time_window,
+    write_csv,
+)
 from processors.report import RunReport
 
+# Compiled once at import; re.ASCII keeps \d and friends on the fast
+# ASCII-only path (NMEA sentences are pure ASCII by definition).
+GPGGA_PATTERN = re.compile(
+    r'\$GPGGA,'
+    r'(\d+\.\d+),'  # Time (HHMMSS.SSS)
+    r'(\d{2})(\d{2}\.\d+),'  # Latitude degrees and minutes
+    r'([NS]),'
+    r'(\d{3})(\d{2}\.\d+),'  # Longitude degrees and minutes
+    r'([EW]),'
+    r'\d+,\d+,'  # Skip fix quality and satellite count
+    # This field occupies the HDOP slot of a standard GPGGA sentence, but
+    # in the Sonardyne SDYN output it behaves as an estimated positional
+    # accuracy in meters: on NA167/H2075 it is ~14.5 m at ~1024 m depth
+    # (~1.4% of slant range, matching typical USBL error specs), whereas a
+    # dimensionless HDOP would sit near 1-2. Downstream (kalman_filter)
+    # squares it as measurement variance in m^2, which is consistent with
+    # that interpretation.
+    r'([\d.]+),'  # Accuracy
+    r'([-0-9.]+),'  # Depth
+    r'M,0\.0,M,0\.0,'
+    r'(\d{4})\*'  # Beacon index
+    r'([0-9A-F]+)',
+    re.ASCII,
+)
+
+
+def _find_gpgga_lines(filepath):
+    """
+    Returns the decoded text of every line containing a $GPGGA sentence, by
+    jumping between occurrences in an mmapped buffer with C-level find --
+    other sentence types are never split or decoded.
+    """
+    if filepath.stat().st_size == 0:
+        return []
+    lines = []
+    with filepath.open("rb") as fp, \
+            mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        size = len(buf)
+        pos = buf.find(b"$GPGGA,")
+        while pos != -1:
+            start = buf.rfind(b"\n", 0, pos) + 1
+            eol = buf.find(b"\n", pos)
+            end = size if eol == -1 else eol
+            if buf[end - 1:end] == b"\r":
+                end -= 1
+            lines.append(bytes(buf[start:end]).decode("utf-8", errors="ignore"))
+            pos = buf.find(b"$GPGGA,", end)
+    return lines
+
+
 def parse_sdyn_file(filepath):
     """
     Parses an SDYN file and extracts USBL fix data.
@@ -37,82 +99,71 @@ def parse_sdyn_file(filepath):
         print(f"Filename {filename} does not match expected format YYYYMMDD_HHMM.SDYN")
         return pd.DataFrame()
 
-    pattern = re.compile(
-        r'\$GPGGA,'
-        r'(\d+\.\d+),'  # Time (HHMMSS.SSS)
-        r'(\d{2})(\d{2}\.\d+),'  # Latitude degrees and minutes
-        r'([NS]),'
-        r'(\d{3})(\d{2}\.\d+),'  # Longitude degrees and minutes
-        r'([EW]),'
-        r'\d+,\d+,'  # Skip fix quality and satellite count
-        # This field occupies the HDOP slot of a standard GPGGA sentence, but
-        # in the Sonardyne SDYN output it behaves as an estimated positional
-        # accuracy in meters: on NA167/H2075 it is ~14.5 m at ~1024 m depth
-        # (~1.4% of slant range, matching typical USBL error specs), whereas a
-        # dimensionless HDOP would sit near 1-2. Downstream (kalman_filter)
-        # squares it as measurement variance in m^2, which is consistent with
-        # that interpretation.
-        r'([\d.]+),'  # Accuracy
-        r'([-0-9.]+),'  # Depth
-        r'M,0\.0,M,0\.0,'
-        r'(\d{4})\*'  # Beacon index
-        r'([0-9A-F]+)'
-    )
-
-    data = []
-    with filepath.open('r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            match = pattern.search(line)
-            if match:
-                (time_str, lat_deg, lat_min, lat_dir, lon_deg, lon_min, lon_dir,
-                 accuracy, depth, beacon_index, checksum) = match.groups()
-
-                # GPGGA time is fixed-width HHMMSS[.sss]; zero-pad defensively so
-                # a value like '12345.6' parses as 01:23:45.6 rather than being
-                # misread by strptime's lenient 1-2 digit matching.
-                if "." in time_str:
-                    int_part, frac_part = time_str.split(".", 1)
-                    time_str = f"{int_part.zfill(6)}.{frac_part}"
-                else:
-                    time_str = time_str.zfill(6)
-                try:
-                    fix_time = datetime.strptime(time_str, "%H%M%S.%f").replace(tzinfo=timezone.utc)
-                except ValueError:
-                    try:
-                        fix_time = datetime.strptime(time_str, "%H%M%S").replace(tzinfo=timezone.utc)
-                    except ValueError:
-                        continue  # malformed time field; skip this fix
-
-                full_timestamp = file_start.replace(
-                    hour=fix_time.hour, minute=fix_time.minute,
-                    second=fix_time.second, microsecond=fix_time.microsecond
-                )
-                if full_timestamp < file_start:
-                    full_timestamp += timedelta(days=1)
-
-                # Convert timestamp to pandas datetime (microseconds kept for now)
-                full_timestamp = pd.to_datetime(full_timestamp.isoformat(), utc=True)
-
-                # Convert latitude and longitude to decimal degrees
-                lat = float(lat_deg) + float(lat_min) / 60.0
-                if lat_dir.upper() == 'S':
-                    lat = -lat
-                lon = float(lon_deg) + float(lon_min) / 60.0
-                if lon_dir.upper() == 'W':
-                    lon = -lon
-
-                beacon_int = int(beacon_index)
-                # Skip processing of Atalanta data (beacon index 2)
-                if beacon_int == 2:
-                    continue
-                elif beacon_int == 1:
-                    vehicle = "Hercules"
-                else:
-                    vehicle = "Unknown"
-
-                data.append([full_timestamp, lat, lon, float(accuracy), float(depth), vehicle])
-
-    return pd.DataFrame(data, columns=["Timestamp", "Latitude", "Longitude", "Accuracy", "Depth", "Vehicle"])
+    out_columns = ["Timestamp", "Latitude", "Longitude", "Accuracy", "Depth", "Vehicle"]
+
+    # The whole file is parsed in one vectorized pass: a single str.extract
+    # applies the GPGGA regex to every candidate line in C, and all field
+    # conversions (time-of-day, decimal degrees, beacon lookup) happen as
+    # column arithmetic instead of per-line Python.
+    lines = _find_gpgga_lines(filepath)
+    if not lines:
+        return pd.DataFrame(columns=out_columns)
+
+    fields = pd.Series(lines).str.extract(GPGGA_PATTERN)
+    fields.columns = ["time", "lat_deg", "lat_min", "lat_dir", "lon_deg",
+                      "lon_min", "lon_dir", "accuracy", "depth", "beacon",
+                      "checksum"]
+    fields = fields.dropna(subset=["time"])
+    if fields.empty:
+        return pd.DataFrame(columns=out_columns)
+
+    # GPGGA time is fixed-width HHMMSS[.sss]; zero-pad defensively so a value
+    # like '12345.6' parses as 01:23:45.6 rather than 12:34:5.6.
+    time_parts = fields["time"].str.split(".", n=1, expand=True)
+    if time_parts.shape[1] < 2:
+        time_parts[1] = None
+    int_part = time_parts[0].str.zfill(6)
+    hours = pd.to_numeric(int_part.str[0:2])
+    minutes = pd.to_numeric(int_part.str[2:4])
+    seconds = pd.to_numeric(int_part.str[4:6])
+    frac_seconds = pd.to_numeric("0." + time_parts[1].fillna("0"))
+
+    beacon = pd.to_numeric(fields["beacon"])
+    valid = (hours < 24) & (minutes < 60) & (seconds < 60)
+    # Skip processing of Atalanta data (beacon index 2)
+    valid &= beacon != 2
+    if not valid.any():
+        return pd.DataFrame(columns=out_columns)
+
+    # Combine the file's date with each fix's time of day; fixes that wrap
+    # past midnight belong to the next day.
+    time_of_day = pd.to_timedelta(
+        hours * 3600 + minutes * 60 + seconds + frac_seconds, unit="s")
+    file_day = pd.Timestamp(file_start).normalize()
+    timestamps = file_day + time_of_day
+    timestamps = timestamps.where(timestamps >= file_start,
+                                  timestamps + pd.Timedelta(days=1))
+
+    # Convert latitude and longitude to decimal degrees
+    lat = pd.to_numeric(fields["lat_deg"]) + pd.to_numeric(fields["lat_min"]) / 60.0
+    lat = lat.where(fields["lat_dir"].str.upper() != "S", -lat)
+    lon = pd.to_numeric(fields["lon_deg"]) + pd.to_numeric(fields["lon_min"]) / 60.0
+    lon = lon.where(fields["lon_dir"].str.upper() != "W", -lon)
+
+    df = pd.DataFrame({
+        "Timestamp": timestamps,
+        "Latitude": lat,
+        "Longitude": lon,
+        "Accuracy": pd.to_numeric(fields["accuracy"]),
+        "Depth": pd.to_numeric(fields["depth"]),
+        # Categorical: one small int per row instead of a Python string, and
+        # the per-vehicle filters become integer-code comparisons.
+        "Vehicle": pd.Categorical(
+            np.where(beacon == 1, "Hercules", "Unknown"),
+            categories=["Hercules", "Atalanta", "Unknown"],
+        ),
+    })
+    return df[valid].reset_index(drop=True)
 
 def process_all_sdyn_files(root_directory):
     """
@@ -130,19 +181,37 @@ def process_all_sdyn_files(root_directory):
     if not sdyn_dir.exists():
         raise FileNotFoundError(f"SDYN directory not found at {sdyn_dir}")
 
-    # Use glob to find all files with .SDYN extension (case-insensitive)
-    files = list(sdyn_dir.glob("*.SDYN")) + list(sdyn_dir.glob("*.sdyn"))
+    # One scandir pass finds all .SDYN files (case-insensitive) using the
+    # type information the directory read already provides, instead of two
+    # glob walks; sorted for a deterministic parse order.
+    with os.scandir(sdyn_dir) as entries:
+        files = sorted(
+            Path(entry.path) for entry in entries
+            if entry.is_file() and entry.name.lower().endswith(".sdyn")
+        )
+
+    # Reruns skip parsing when no SDYN file changed (Feather cache keyed on
+    # the input fingerprint, like the .DAT ingest).
+    cache_dir = root_directory / "RUMI_processed" / ".cache"
+    key = file_set_fingerprint(files)
+    cached = load_ingest_cache(cache_dir, "sdyn", key)
+    if cached is not None:
+        print(f"  - Using cached SDYN ingest ({len(files)} files unchanged)")
+        return cached
+
+    # SDYN files parse independently (CPU-bound regex + timestamp work), so
+    # spread them across a process pool when there is more than one.
+    if len(files) > 1:
+        with ProcessPoolExecutor() as pool:
+            parsed = list(pool.map(parse_sdyn_file, files))
+    else:
+        parsed = [parse_sdyn_file(f) for f in files]
 
-    dataframes = []
-    for filepath in files:
-        df = parse_sdyn_file(filepath)
-        if not df.empty:
-            dataframes.append(df)
+    dataframes = [df for df in parsed if not df.empty]
 
-    if dataframes:
-        return pd.concat(dataframes, ignore_index=True)
-    else:
-        return pd.DataFrame()
+    sdyn_data = pd.concat(dataframes, ignore_index=True) if dataframes else pd.DataFrame()
+    save_ingest_cache(cache_dir, "sdyn", key, sdyn_data)
+    return sdyn_data
 
 def process_dive_vehicle(dive_summary, sdyn_data):
     """
@@ -163,8 +232,14 @@ def process_dive_vehicle(dive_summary, sdyn_data):
     launch_time = dive_summary["Launch Time"]
     recovery_time = dive_summary["Recovery Time"]
 
-    sdyn_data["Timestamp"] = pd.to_datetime(sdyn_data["Timestamp"], utc=True)
-    df_dive = sdyn_data[(sdyn_data["Timestamp"] >= launch_time) & (sdyn_data["Timestamp"] <= recovery_time)]
+    if pd.isnull(launch_time) or pd.isnull(recovery_time):
+        print(f"No USBL fixes for dive {dive_id}.")
+        return {}
+
+    # sdyn_data arrives sorted with a datetime64 UTC Timestamp (normalized
+    # once in process_data); binary-search the dive window instead of
+    # scanning the whole frame per dive.
+    df_dive = slice_time_window(sdyn_data, launch_time, recovery_time)
     if df_dive.empty:
         print(f"No USBL fixes for dive {dive_id}.")
         return {}
@@ -230,6 +305,11 @@ def process_data(root_directory):
         report.finalize()
         return
 
+    # Normalize the timestamp dtype and sort once for all dives (the per-dive
+    # window filter relies on chronological order).
+    sdyn_data["Timestamp"] = pd.to_datetime(sdyn_data["Timestamp"], utc=True)
+    sdyn_data.sort_values("Timestamp", inplace=True, kind="mergesort")
+
     # Process each dive and save output files
     for _, dive_row in dive_summaries.iterrows():
         dive_id = str(dive_row["dive"]).strip()
@@ -249,7 +329,7 @@ def process_data(root_directory):
                 fname = f"{expedition}_{dive_id}_USBL_{vehicle}.csv"
                 outpath = dive_out_dir / fname
                 try:
-                    df_final.to_csv(outpath, index=False)
+                    write_csv(df_final, outpath)
                     print(f"Saved processed data for dive {dive_id}, vehicle {vehicle} to: {outpath}")
                     report.add_output(outpath, rows=len(df_final))
                 except Exception as e:
@@ -15,7 +15,9 @@ from processors.common import (
     best_fix_per_second,
     drop_duplicate_timestamps,
     determine_utm_zone,
+    slice_time_window,
 )
+from processors.sensors_sealog import load_tsv_file
 from processors.usbl_sdyn import parse_sdyn_file
 from processors.process_dat import parse_dat_file_both
 from processors.dive_summaries import process_dive_folder
@@ -125,6 +127,30 @@ class TestDropDuplicateTimestamps:
         assert out.empty and removed == 0
 
 
+class TestSliceTimeWindow:
+    def _frame(self):
+        ts = pd.date_range("2024-11-05T12:00:00Z", periods=10, freq="1s")
+        return pd.DataFrame({"Timestamp": ts, "v": range(10)})
+
+    def test_bounds_inclusive(self):
+        df = self._frame()
+        out = slice_time_window(df, pd.Timestamp("2024-11-05T12:00:03Z"),
+                                pd.Timestamp("2024-11-05T12:00:06Z"))
+        assert list(out["v"]) == [3, 4, 5, 6]
+
+    def test_window_outside_data_is_empty(self):
+        df = self._frame()
+        out = slice_time_window(df, pd.Timestamp("2024-11-05T13:00:00Z"),
+                                pd.Timestamp("2024-11-05T14:00:00Z"))
+        assert out.empty
+
+    def test_empty_frame(self):
+        empty = pd.DataFrame({"Timestamp": pd.Series([], dtype="datetime64[ns, UTC]")})
+        out = slice_time_window(empty, pd.Timestamp("2024-11-05T12:00:00Z"),
+                                pd.Timestamp("2024-11-05T12:00:01Z"))
+        assert out.empty
+
+
 class TestUtmZone:
     def test_regular_zones(self):
         assert determine_utm_zone(133.95, 5.67) == (53, "north")   # Palau (NA167)
@@ -231,6 +257,15 @@ class TestParseDat:
         _, vfr_df = parse_dat_file_both(f)
         assert vfr_df.empty
 
+    def test_trailing_extra_fields_accepted(self, tmp_path):
+        # The record regexes were never end-anchored: lines with trailing
+        # extra fields beyond the assumed layout must still parse.
+        f = tmp_path / "test.DAT"
+        f.write_text(oct_line() + " 10.0 11.0\n" + vfr_line() + " extra\n")
+        oct_df, vfr_df = parse_dat_file_both(f)
+        assert len(oct_df) == 1 and len(vfr_df) == 1
+        assert oct_df.iloc[0]["Heading"] == pytest.approx(228.42)
+
     def test_malformed_second_field_skipped(self, tmp_path):
         f = tmp_path / "test.DAT"
         f.write_text(oct_line(ts="2024/11/05 23:13:61.0") + "\n" + oct_line() + "\n")
@@ -238,6 +273,23 @@ class TestParseDat:
         assert len(oct_df) == 1
 
 
+# ---------------------------------------------------------------------------
+# sensors_sealog.load_tsv_file
+# ---------------------------------------------------------------------------
+
+class TestLoadTsvFile:
+    def test_enforce_negative_flips_sensor_values(self, tmp_path):
+        # Depths must come out negative-down regardless of the sign in the
+        # raw TSV (the DEP1/Herc_Depth stream relies on this).
+        f = tmp_path / "NA167.DEP1.sampled.tsv"
+        f.write_text("2024-11-05T23:13:02.123Z\t1009.4\n"
+                     "2024-11-05T23:13:03.456Z\t-1010.2\n")
+        df = load_tsv_file(f, sensor_name="Herc_Depth", enforce_negative=True)
+        assert df is not None
+        assert list(df.columns) == ["Timestamp", "Herc_Depth_1"]
+        assert df["Herc_Depth_1"].tolist() == [-1009.4, -1010.2]
+
+
 # ---------------------------------------------------------------------------
 # dive_summaries.process_dive_folder
 # ---------------------------------------------------------------------------